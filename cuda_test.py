@@ -21,8 +21,9 @@ def main():
 
     # Check if CUDA is available
     try:
-        print(f"\n✓ CUDA available: {cuda.is_available()}")
-        if not cuda.is_available():
+        available = cuda.is_available()
+        print(f"\n✓ CUDA available: {available}")
+        if not available:
             print("✗ CUDA is not available on this system")
             sys.exit(1)
     except Exception as e:
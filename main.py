@@ -1,68 +1,735 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, UploadFile, File, Query, HTTPException
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+from prometheus_client import CollectorRegistry, Histogram, make_asgi_app
 import numpy as np
 from numba import cuda
 import time
-import io
-import subprocess
-import re
+import asyncio
+import functools
+from contextlib import asynccontextmanager
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import zipfile
+import tempfile
+import shutil
+import uuid
+import ctypes
+import logging
+import os
+import pynvml
 
-app = FastAPI(title="GPU Matrix Addition Service")
+try:
+    # Driver API bindings shipped with numba-cuda, used for CUDA graphs
+    from cuda.bindings import driver as cuda_driver
+except ImportError:
+    cuda_driver = None
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Set up the GPU and NVML before serving requests and release NVML on shutdown"""
+    await init_gpu(app)
+    init_nvml()
+    purge_task = asyncio.create_task(_purge_matrices_periodically())
+    try:
+        yield
+    finally:
+        purge_task.cancel()
+        shutdown_nvml()
+
+
+app = FastAPI(title="GPU Matrix Addition Service", lifespan=lifespan)
+
+# Prometheus metrics, kept in a registry owned by this module: uvicorn imports
+# it again from the "main:app" string, which would otherwise register the same
+# metrics twice in the global registry. Each worker process exports its own
+# metrics.
+METRICS_REGISTRY = CollectorRegistry()
+app.mount("/metrics", make_asgi_app(registry=METRICS_REGISTRY))
+
+# Time spent in each phase of /add: load (parsing the uploads), stage (copy
+# into pinned memory), h2d, kernel and d2h (measured with CUDA events, which
+# are captured as event-record nodes when a CUDA graph is used), host
+# (addition on the CPU path) and response (serializing the result)
+PHASE_SECONDS = Histogram(
+    "matrix_add_phase_seconds",
+    "Time spent in each phase of a matrix addition",
+    ["phase"],
+    buckets=(1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+    registry=METRICS_REGISTRY
+)
 
 # Student port - CHANGE THIS TO YOUR ASSIGNED PORT
 STUDENT_PORT = 8020
 
-@cuda.jit
-def matrix_add_kernel(a, b, c):
+# Uvicorn worker processes, set with the WORKERS environment variable; each
+# one has its own CUDA context and buffers. Only a single worker serves every
+# feature correctly: matrices stored with /upload live in the worker that
+# received them (a handle is unknown to the others), and each worker exports
+# its own /metrics registry, so a scrape only sees the worker that answered.
+WORKERS = int(os.environ.get("WORKERS", "1"))
+
+# CUDA streams per worker. Each in-flight GPU addition holds one stream, so up
+# to this many requests can overlap their copies and kernels on the GPU.
+STREAMS_PER_WORKER = 4
+
+# Matrices stored on the GPU with /upload are freed after this many seconds
+# without being used
+RESIDENT_TTL_SECONDS = 600
+
+# Device memory that resident matrices may hold in total; /upload and
+# /add-persistent answer 507 once it is used up
+MAX_RESIDENT_BYTES = 4 * 2**30
+
+# Seconds between two background sweeps for expired resident matrices, so
+# they are freed even when no request comes in
+RESIDENT_PURGE_INTERVAL = 60
+
+# Size of the chunks copied from an upload to its temporary .npy file
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Below this many elements the PCIe transfers cost far more than the addition
+# itself, so smaller matrices are added on the host instead of the GPU
+GPU_MIN_ELEMENTS = 4096 * 4096
+
+# Launch configuration of the grid-stride kernel: a fixed number of blocks
+# per streaming multiprocessor, whatever the matrix size. Each block is 8 full
+# warps; consecutive lanes of a warp read consecutive elements, so every warp
+# access is one coalesced 128-byte segment for float32.
+WARP_SIZE = 32
+THREADS_PER_BLOCK = WARP_SIZE * 8
+BLOCKS_PER_SM = 8
+
+
+# Element types accepted by the precision query parameter of /add. bf16 is not
+# offered: NumPy has no bfloat16 dtype and Numba cannot compile kernels for it.
+PRECISIONS = {
+    "fp32": np.float32,
+    "fp16": np.float16,
+}
+
+
+@cuda.jit([
+    "void(float32[:, ::1], float32[::1])",
+    "void(float16[:, ::1], float16[::1])",
+])
+def matrix_add_kernel(ab, c):
     """
     CUDA kernel for matrix addition.
-    Each thread processes one element of the matrix.
+    Both operands are passed flattened and stacked in one (2, N) array, so
+    they reach the GPU in a single transfer. Each thread walks the elements
+    with a grid-stride loop, so one launch configuration covers every matrix
+    size.
+
+    The explicit signatures (float32, and float16 to halve the memory
+    traffic) make Numba compile the kernel at import time instead of on the
+    first /add request.
+    """
+    # Global index of the current thread and total number of threads
+    start = cuda.grid(1)
+    stride = cuda.gridsize(1)
+
+    for k in range(start, c.size, stride):
+        c[k] = ab[0, k] + ab[1, k]
+
+
+@cuda.jit([
+    "void(float32[::1], float32[::1], float32[::1])",
+    "void(float16[::1], float16[::1], float16[::1])",
+])
+def matrix_add_pair_kernel(a, b, c):
+    """
+    CUDA kernel adding two flattened matrices that are already resident on
+    the GPU as separate arrays (see /add-persistent). Same grid-stride loop as
+    matrix_add_kernel.
+    """
+    start = cuda.grid(1)
+    stride = cuda.gridsize(1)
+
+    for k in range(start, c.size, stride):
+        c[k] = a[k] + b[k]
+
+
+@functools.lru_cache(maxsize=None)
+def _blocks_per_grid():
+    """Number of blocks launched by the grid-stride kernel on this device"""
+    return BLOCKS_PER_SM * cuda.get_current_device().MULTIPROCESSOR_COUNT
+
+
+# NVML device handles used by /gpu-info, set up at startup (None if NVML
+# could not be initialized)
+_nvml_handles = None
+
+# Memory the cached GPU plans (shape, dtype and stream combinations) may keep
+# allocated between requests, counting both their pinned host buffers and
+# their device buffers. A 4096x4096 float32 plan takes about 400MB, so the
+# default keeps one such plan per stream of STREAMS_PER_WORKER.
+MAX_CACHED_PLAN_BYTES = 2 * 2**30
+
+# GPU plans, reused across requests with the same shape, dtype and stream and
+# evicted least-recently-used first
+_buffer_cache = OrderedDict()
+_buffer_cache_bytes = 0
+
+# Plan of the addition in flight on each stream. Requests only see the plan
+# through this table, on the CUDA thread, so a plan evicted while in use is
+# still released on that thread (where Numba frees its buffers) once its
+# request finishes, never on the event loop.
+_active_plans = {}
+
+# Single thread that runs every CUDA call of this worker, so the CUDA context
+# stays bound to one thread while the event loop is never blocked by the GPU
+_gpu_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cuda")
+
+# Pool of CUDA streams, filled at startup. A request takes a stream for its
+# whole H2D/kernel/D2H sequence (see _pooled_stream), which also gives it
+# exclusive use of the plans bound to that stream.
+_stream_pool = asyncio.Queue()
+
+
+def _check_driver(result):
+    """Unpack a cuda.bindings driver call result, raising on error"""
+    err, *values = result
+    if err != cuda_driver.CUresult.CUDA_SUCCESS:
+        raise RuntimeError(f"CUDA driver call failed: {err}")
+    return values[0] if values else None
+
+
+def _driver_handle(obj):
+    """
+    The raw handle of a Numba stream or event, for cuda.bindings driver calls.
+    Numba exposes it as a ctypes pointer or as a cuda.bindings object
+    depending on the driver binding it was configured with.
+    """
+    handle = obj.handle
+    if isinstance(handle, ctypes.c_void_p):
+        return handle.value or 0
+    return handle
+
+
+class _AddPlan:
+    """
+    Buffers and kernel launch used to add matrices of one shape on one stream.
+
+    Both operands are staged in one (2, N) pinned buffer so that a single H2D
+    copy, the kernel and the D2H copy are queued on the plan's stream. The
+    kernel is specialized for the buffer types and its launch configuration is
+    bound once, so launches skip Numba's argument type dispatch.
+
+    When the cuda.bindings driver API is available, the first run captures
+    that sequence into a CUDA graph and later runs replay it with a single
+    cuGraphLaunch. If capture fails, the plan keeps queuing the operations
+    one by one. The timing events around each operation are captured as
+    external event-record nodes, so graph replays record them as well.
     """
-    # Get the 2D position of the current thread
-    i, j = cuda.grid(2)
 
-    # Boundary check to ensure we don't go out of bounds
-    if i < a.shape[0] and j < a.shape[1]:
-        c[i, j] = a[i, j] + b[i, j]
+    def __init__(self, shape, dtype, stream):
+        size = int(np.prod(shape))
+        self.shape = shape
+        self.d_ab = cuda.device_array((2, size), dtype=dtype)
+        self.d_c = cuda.device_array(size, dtype=dtype)
+        self.pinned_ab = cuda.pinned_array((2, size), dtype=dtype)
+        self.pinned_out = cuda.pinned_array(size, dtype=dtype)
+        self.nbytes = (self.d_ab.nbytes + self.d_c.nbytes
+                       + self.pinned_ab.nbytes + self.pinned_out.nbytes)
+        self.stream = stream
+        self.launch = matrix_add_kernel.specialize(self.d_ab, self.d_c)[
+            _blocks_per_grid(), THREADS_PER_BLOCK, self.stream
+        ]
+        # Timing events recorded around the H2D copy, the kernel and the D2H copy
+        self.events = [cuda.event(timing=True) for _ in range(4)]
+        # Instantiated graphs, keyed by whether they include the D2H copy
+        self.graph_execs = {}
+        self.use_graph = cuda_driver is not None
+
+    def stage(self, matrix_a: np.ndarray, matrix_b: np.ndarray):
+        """Copy the inputs into the pinned staging buffer (casting to the plan's dtype)"""
+        self.pinned_ab[0].reshape(self.shape)[...] = matrix_a
+        self.pinned_ab[1].reshape(self.shape)[...] = matrix_b
+
+    def run(self, copy_back: bool = True):
+        """Queue the H2D copy, the kernel and (if copy_back) the D2H copy on the stream"""
+        if self.use_graph and copy_back not in self.graph_execs:
+            graph_exec = self._capture(copy_back)
+            if graph_exec is not None:
+                self.graph_execs[copy_back] = graph_exec
+        graph_exec = self.graph_execs.get(copy_back)
+        if graph_exec is not None:
+            _check_driver(cuda_driver.cuGraphLaunch(graph_exec, _driver_handle(self.stream)))
+        else:
+            self._enqueue(copy_back)
+
+    def result(self) -> np.ndarray:
+        """The pinned result buffer, valid once the stream has completed"""
+        return self.pinned_out.reshape(self.shape)
+
+    def observe_phases(self, copy_back: bool):
+        """
+        Record the GPU time of the last run in PHASE_SECONDS. Runs on the CUDA
+        thread, once the stream has completed.
+        """
+        phases = ["h2d", "kernel", "d2h"] if copy_back else ["h2d", "kernel"]
+        for phase, start, end in zip(phases, self.events, self.events[1:]):
+            PHASE_SECONDS.labels(phase=phase).observe(cuda.event_elapsed_time(start, end) / 1000)
+
+    def close(self):
+        """Release the instantiated graphs, if any"""
+        for graph_exec in self.graph_execs.values():
+            cuda_driver.cuGraphExecDestroy(graph_exec)
+        self.graph_execs.clear()
+
+    def _enqueue(self, copy_back, capturing=False):
+        self._record(0, capturing)
+        self.d_ab.copy_to_device(self.pinned_ab, stream=self.stream)
+        self._record(1, capturing)
+        self.launch(self.d_ab, self.d_c)
+        self._record(2, capturing)
+        if copy_back:
+            self.d_c.copy_to_host(self.pinned_out, stream=self.stream)
+            self._record(3, capturing)
 
+    def _record(self, index, capturing):
+        # A plain event record made during capture does not become a graph
+        # node; an external one does, and is recorded on every replay
+        event = self.events[index]
+        if not capturing:
+            event.record(self.stream)
+            return
+        _check_driver(cuda_driver.cuEventRecordWithFlags(
+            _driver_handle(event), _driver_handle(self.stream),
+            cuda_driver.CUevent_record_flags.CU_EVENT_RECORD_EXTERNAL
+        ))
 
-def gpu_matrix_add(matrix_a: np.ndarray, matrix_b: np.ndarray):
+    def _capture(self, copy_back):
+        handle = _driver_handle(self.stream)
+        try:
+            _check_driver(cuda_driver.cuStreamBeginCapture(
+                handle, cuda_driver.CUstreamCaptureMode.CU_STREAM_CAPTURE_MODE_THREAD_LOCAL
+            ))
+            try:
+                self._enqueue(copy_back, capturing=True)
+            finally:
+                graph = _check_driver(cuda_driver.cuStreamEndCapture(handle))
+            try:
+                return _check_driver(cuda_driver.cuGraphInstantiate(graph, 0))
+            finally:
+                cuda_driver.cuGraphDestroy(graph)
+        except Exception:
+            self.use_graph = False
+            return None
+
+
+def _get_plan(shape, dtype, stream) -> _AddPlan:
+    """Return the cached plan for a matrix shape, dtype and stream, creating it if needed"""
+    global _buffer_cache_bytes
+    key = (shape, np.dtype(dtype), stream)
+    plan = _buffer_cache.get(key)
+    if plan is not None:
+        _buffer_cache.move_to_end(key)
+        return plan
+
+    # Free least-recently-used plans until the new one fits. A plan larger
+    # than the whole budget is still created, and then cached on its own.
+    # A plan holds three matrices on the device (a, b, c) and three pinned.
+    nbytes = 6 * int(np.prod(shape)) * np.dtype(dtype).itemsize
+    while _buffer_cache and _buffer_cache_bytes + nbytes > MAX_CACHED_PLAN_BYTES:
+        _, evicted = _buffer_cache.popitem(last=False)
+        _buffer_cache_bytes -= evicted.nbytes
+        evicted.close()
+
+    plan = _AddPlan(shape, dtype, stream)
+    _buffer_cache[key] = plan
+    _buffer_cache_bytes += plan.nbytes
+    return plan
+
+
+async def gpu_matrix_add(matrix_a: np.ndarray, matrix_b: np.ndarray, stream,
+                         copy_back: bool = True, dtype=np.float32):
     """
     Perform matrix addition on GPU using CUDA.
 
+    The work is done by the cached _AddPlan for the matrix shape on the given
+    stream, which the caller must have taken from _stream_pool. The event loop
+    keeps serving other requests while the GPU works.
+
     Args:
         matrix_a: First input matrix (NumPy array)
         matrix_b: Second input matrix (NumPy array)
+        stream: CUDA stream taken from _stream_pool
+        copy_back: Whether to copy the result back to the host
+        dtype: Element type the addition is carried out in (float32 or float16)
 
     Returns:
-        tuple: (result_matrix, elapsed_time)
+        tuple: (result_bytes, elapsed_time). The result is serialized in C
+        order on the CUDA thread, or None when copy_back is False.
     """
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+
     # Start timing
     start_time = time.perf_counter()
 
-    # Transfer data to GPU
-    d_a = cuda.to_device(matrix_a)
-    d_b = cuda.to_device(matrix_b)
-    d_c = cuda.device_array_like(d_a)
+    # Stage and queue the work on the CUDA thread, then wait for the stream
+    # to signal completion
+    await loop.run_in_executor(
+        _gpu_executor, _submit_gpu_add, matrix_a, matrix_b, stream, copy_back, dtype, done
+    )
+    await done
+
+    # End timing
+    elapsed_time = time.perf_counter() - start_time
 
-    # Configure the blocks and threads
-    threads_per_block = (16, 16)  # 16x16 = 256 threads per block
-    blocks_per_grid_x = (matrix_a.shape[0] + threads_per_block[0] - 1) // threads_per_block[0]
-    blocks_per_grid_y = (matrix_a.shape[1] + threads_per_block[1] - 1) // threads_per_block[1]
-    blocks_per_grid = (blocks_per_grid_x, blocks_per_grid_y)
+    # Read the per-phase GPU timings and serialize the pinned result before
+    # the stream goes back to the pool
+    payload = await loop.run_in_executor(_gpu_executor, _finish_gpu_add, stream, copy_back)
+    return payload, elapsed_time
 
-    # Launch kernel
-    matrix_add_kernel[blocks_per_grid, threads_per_block](d_a, d_b, d_c)
 
-    # Copy result back to host
-    result = d_c.copy_to_host()
+def _submit_gpu_add(matrix_a, matrix_b, stream, copy_back, dtype, done):
+    """
+    Queue a matrix addition on a stream. Runs on the CUDA thread.
 
-    # End timing
+    The done future is resolved on its event loop once the stream has
+    finished the work.
+    """
+    # Copy the inputs into pinned memory (this also casts them to dtype and
+    # makes them C-contiguous, as the compiled kernel signatures expect)
+    stage_start = time.perf_counter_ns()
+    plan = _get_plan(matrix_a.shape, dtype, stream)
+    plan.stage(matrix_a, matrix_b)
+    _observe_phase("stage", stage_start)
+
+    # Transfer both matrices, add them and copy the result back if needed
+    plan.run(copy_back)
+    _active_plans[stream] = plan
+    stream.add_callback(_notify_stream_done, done)
+
+
+def _finish_gpu_add(stream, copy_back):
+    """
+    Record the phase timings of a completed addition and serialize its
+    result, then release the stream's plan. Runs on the CUDA thread.
+    """
+    plan = _active_plans.pop(stream)
+    try:
+        plan.observe_phases(copy_back)
+    except Exception:
+        logger.exception("Failed to record GPU phase timings")
+    if not copy_back:
+        return None
+    response_start = time.perf_counter_ns()
+    payload = plan.result().tobytes()
+    _observe_phase("response", response_start)
+    return payload
+
+
+def _notify_stream_done(stream, status, future):
+    """Stream callback (runs on a CUDA driver thread): resolve the future on its loop"""
+    future.get_loop().call_soon_threadsafe(_resolve_stream_future, future, status)
+
+
+def _resolve_stream_future(future, status):
+    if future.done():
+        return
+    if status == 0:
+        future.set_result(None)
+    else:
+        future.set_exception(RuntimeError(f"CUDA stream error: {status}"))
+
+
+def _log_background_error(future):
+    """Done callback of a background task on the CUDA thread: log its failure, if any"""
+    error = future.exception()
+    if error is not None:
+        logger.error("Background CUDA task failed", exc_info=error)
+
+
+@asynccontextmanager
+async def _pooled_stream():
+    """
+    Take a stream from _stream_pool for the duration of the block.
+
+    If the block fails or is cancelled, work may still be queued on the
+    stream (and reading the pinned buffers of its plans), so the stream only
+    goes back to the pool once a CUDA-thread task has synchronized it.
+    """
+    stream = await _stream_pool.get()
+    try:
+        yield stream
+    except BaseException:
+        loop = asyncio.get_running_loop()
+        _gpu_executor.submit(_return_drained_stream, stream, loop).add_done_callback(_log_background_error)
+        raise
+    _stream_pool.put_nowait(stream)
+
+
+def _return_drained_stream(stream, loop):
+    """Wait for a stream's queued work, then put it back in the pool. Runs on the CUDA thread."""
+    try:
+        stream.synchronize()
+    finally:
+        loop.call_soon_threadsafe(_stream_pool.put_nowait, stream)
+
+
+class _ResidentMatrix:
+    """A flattened matrix kept in device memory between requests"""
+
+    def __init__(self, array, shape):
+        self.array = array
+        self.shape = shape
+        self.nbytes = array.nbytes
+        self.touch()
+
+    def touch(self):
+        """Push back the expiry time after the matrix has been used"""
+        self.expires = time.monotonic() + RESIDENT_TTL_SECONDS
+
+
+# Matrices uploaded with /upload, keyed by handle
+_resident_matrices = {}
+
+# Device memory held by resident matrices, plus the memory reserved for the
+# ones being created
+_resident_bytes = 0
+
+
+def _reserve_resident_bytes(nbytes: int):
+    """Account for a new resident matrix, raising HTTP 507 if it does not fit"""
+    global _resident_bytes
+    if _resident_bytes + nbytes > MAX_RESIDENT_BYTES:
+        raise HTTPException(
+            status_code=507,
+            detail=f"Not enough room for resident matrices: {_resident_bytes} of "
+                   f"{MAX_RESIDENT_BYTES} bytes in use, {nbytes} requested"
+        )
+    _resident_bytes += nbytes
+
+
+def _release_resident_bytes(nbytes: int):
+    global _resident_bytes
+    _resident_bytes -= nbytes
+
+
+async def _free_resident_matrices(handles):
+    """
+    Remove resident matrices. Their device arrays are released on the CUDA
+    thread, where Numba runs the deferred frees, rather than on the event loop.
+    """
+    released = [_resident_matrices.pop(handle) for handle in handles]
+    _release_resident_bytes(sum(matrix.nbytes for matrix in released))
+    await _release_on_gpu_thread(released)
+
+
+async def _release_on_gpu_thread(references: list):
+    """
+    Drop a list of references to device memory on the CUDA thread. The caller
+    must not keep other references to the same objects.
+    """
+    await asyncio.get_running_loop().run_in_executor(_gpu_executor, references.clear)
+
+
+async def _purge_expired_matrices():
+    """Free the resident matrices that have not been used within their TTL"""
+    now = time.monotonic()
+    expired = [h for h, m in _resident_matrices.items() if m.expires <= now]
+    if expired:
+        await _free_resident_matrices(expired)
+
+
+async def _purge_matrices_periodically():
+    """Background task started by lifespan: sweep expired matrices every RESIDENT_PURGE_INTERVAL"""
+    while True:
+        await asyncio.sleep(RESIDENT_PURGE_INTERVAL)
+        try:
+            await _purge_expired_matrices()
+        except Exception:
+            logger.exception("Failed to free expired resident matrices")
+
+
+async def _get_resident_matrix(handle: str) -> _ResidentMatrix:
+    """Return a resident matrix, raising HTTP 404 if the handle is unknown or expired"""
+    await _purge_expired_matrices()
+    matrix = _resident_matrices.get(handle)
+    if matrix is None:
+        raise HTTPException(status_code=404, detail=f"Unknown matrix handle: {handle}")
+    matrix.touch()
+    return matrix
+
+
+def _submit_upload(matrix: np.ndarray, dtype, stream, done):
+    """
+    Queue the copy of a matrix to the GPU, as a flat array of dtype, on a
+    stream. Runs on the CUDA thread.
+
+    Returns:
+        tuple: (device array, host array being copied). The host array must
+        be kept alive until done is resolved.
+    """
+    host = np.ascontiguousarray(matrix, dtype=dtype).reshape(-1)
+    d_matrix = cuda.to_device(host, stream=stream)
+    stream.add_callback(_notify_stream_done, done)
+    return d_matrix, host
+
+
+def _submit_download(d_matrix, shape, stream, done):
+    """Queue the copy of a resident matrix back to the host on a stream. Runs on the CUDA thread."""
+    host = np.empty(shape, dtype=d_matrix.dtype)
+    d_matrix.copy_to_host(host.reshape(-1), stream=stream)
+    stream.add_callback(_notify_stream_done, done)
+    return host
+
+
+def _submit_resident_add(d_a, d_b, stream, done):
+    """
+    Queue the addition of two resident matrices on a stream. Runs on the CUDA
+    thread and returns the (not yet computed) device result.
+    """
+    d_c = cuda.device_array_like(d_a, stream=stream)
+    matrix_add_pair_kernel[_blocks_per_grid(), THREADS_PER_BLOCK, stream](d_a, d_b, d_c)
+    stream.add_callback(_notify_stream_done, done)
+    return d_c
+
+
+def cpu_matrix_add(matrix_a: np.ndarray, matrix_b: np.ndarray):
+    """
+    Perform matrix addition on the host with a vectorized NumPy add.
+    The inputs are cast to float32 inside the ufunc loop. The host path always
+    adds in float32: the inputs are already in RAM at their original width,
+    so float16 would save no bandwidth, and NumPy's float16 loops are
+    emulated in software and slower than float32.
+
+    Args:
+        matrix_a: First input matrix (NumPy array)
+        matrix_b: Second input matrix (NumPy array)
+
+    Returns:
+        tuple: (result_matrix, elapsed_time)
+    """
+    result = np.empty(matrix_a.shape, dtype=np.float32)
+
+    # Only the addition itself is timed
+    start_time = time.perf_counter()
+    np.add(matrix_a, matrix_b, out=result, dtype=np.float32, casting="unsafe")
     elapsed_time = time.perf_counter() - start_time
 
     return result, elapsed_time
 
 
+def _observe_phase(phase: str, start_ns: int):
+    """Record the time elapsed since start_ns (from time.perf_counter_ns) for a phase"""
+    PHASE_SECONDS.labels(phase=phase).observe((time.perf_counter_ns() - start_ns) / 1e9)
+
+
+def _resolve_precision(precision: str):
+    """Map a precision query parameter to its NumPy dtype, raising HTTP 400 if unknown"""
+    if precision not in PRECISIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported precision: {precision} (expected one of {', '.join(PRECISIONS)})"
+        )
+    return PRECISIONS[precision]
+
+
+def load_matrix(upload: UploadFile) -> np.ndarray:
+    """
+    Load the first array of an uploaded .npz file.
+
+    The upload is first copied in chunks from its spooled temporary file into
+    a named temporary file, which zipfile can read on every Python version
+    (SpooledTemporaryFile only gained seekable() in Python 3.11). The .npy
+    member is then streamed into a second named temporary file, which is
+    memory-mapped: the array is backed by the page cache rather than by a
+    second copy in RAM, and the GPU staging copy reads straight from the
+    mapped pages. The mapping stays valid after the temporary file is removed.
+    Fortran-ordered arrays are converted to C order here, in the loader
+    thread, so that the later staging copies and host additions walk memory
+    linearly.
+
+    Args:
+        upload: Uploaded .npz file
+
+    Returns:
+        np.ndarray: The first array stored in the archive (read-only)
+    """
+    upload.file.seek(0)
+    with tempfile.NamedTemporaryFile(suffix=".npz") as archive_file:
+        shutil.copyfileobj(upload.file, archive_file, UPLOAD_CHUNK_SIZE)
+        archive_file.flush()
+        archive_file.seek(0)
+        with zipfile.ZipFile(archive_file) as archive:
+            with archive.open(archive.namelist()[0]) as member, \
+                    tempfile.NamedTemporaryFile(suffix=".npy") as tmp:
+                shutil.copyfileobj(member, tmp, UPLOAD_CHUNK_SIZE)
+                tmp.flush()
+                matrix = np.load(tmp.name, mmap_mode="r", allow_pickle=False)
+    return np.ascontiguousarray(matrix)
+
+
+def _init_gpu():
+    """
+    Select the GPU, warm up the kernels and read the device capabilities, all
+    in one pass. Runs on the CUDA thread.
+
+    Returns:
+        tuple: (device_info, streams)
+    """
+    cuda.select_device(0)
+    device = cuda.get_current_device()
+
+    # Launch the kernel once per precision; this also builds the specialized
+    # kernel used by _AddPlan
+    for dtype in PRECISIONS.values():
+        d_ab = cuda.to_device(np.zeros((2, 1), dtype=dtype))
+        d_c = cuda.device_array(1, dtype=dtype)
+        matrix_add_kernel.specialize(d_ab, d_c)[1, 1](d_ab, d_c)
+    _blocks_per_grid()
+    cuda.synchronize()
+
+    name = device.name
+    _, total_memory = cuda.current_context().get_memory_info()
+    device_info = {
+        "name": name.decode() if isinstance(name, bytes) else name,
+        "compute_capability": list(device.compute_capability),
+        "multiprocessor_count": device.MULTIPROCESSOR_COUNT,
+        "memory_total_MB": total_memory // 2**20
+    }
+    streams = [cuda.stream() for _ in range(STREAMS_PER_WORKER)]
+    return device_info, streams
+
+
+async def init_gpu(app: FastAPI):
+    """
+    Probe the GPU once before serving requests: create the CUDA context, warm
+    up the kernels, cache the device capabilities on app.state.cuda_device and
+    create the CUDA streams shared by the GPU additions of this worker.
+    """
+    device_info, streams = await asyncio.get_running_loop().run_in_executor(_gpu_executor, _init_gpu)
+    app.state.cuda_device = device_info
+    for stream in streams:
+        _stream_pool.put_nowait(stream)
+
+
+def init_nvml():
+    """Initialize NVML and look up the device handles once"""
+    global _nvml_handles
+    try:
+        pynvml.nvmlInit()
+        _nvml_handles = [
+            pynvml.nvmlDeviceGetHandleByIndex(i) for i in range(pynvml.nvmlDeviceGetCount())
+        ]
+    except pynvml.NVMLError:
+        _nvml_handles = None
+
+
+def shutdown_nvml():
+    """Release NVML"""
+    if _nvml_handles is not None:
+        pynvml.nvmlShutdown()
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -72,25 +739,38 @@ async def health_check():
 @app.post("/add")
 async def add_matrices(
     file_a: UploadFile = File(..., description="First matrix (.npz file)"),
-    file_b: UploadFile = File(..., description="Second matrix (.npz file)")
+    file_b: UploadFile = File(..., description="Second matrix (.npz file)"),
+    return_result: bool = Query(False, description="Return the sum as raw bytes"),
+    precision: str = Query("fp32", description="Element type of the addition: fp32 or fp16")
 ):
     """
     Add two matrices on GPU.
 
     Accepts two .npz files containing NumPy arrays and returns their sum computed on GPU.
-    """
-    try:
-        # Read the uploaded files
-        content_a = await file_a.read()
-        content_b = await file_b.read()
+    Matrices smaller than GPU_MIN_ELEMENTS are added on the host, where the sum is
+    cheaper than the transfers to and from the device.
 
-        # Load matrices from .npz files
-        with np.load(io.BytesIO(content_a)) as data:
-            # Get the first array from the .npz file
-            matrix_a = data[data.files[0]]
+    The addition is carried out in float32 by default; precision=fp16 halves the
+    bytes transferred and touched by the kernel at the cost of accuracy. On the
+    host path the addition is always done in float32, and precision only sets
+    the element type of the returned bytes.
 
-        with np.load(io.BytesIO(content_b)) as data:
-            matrix_b = data[data.files[0]]
+    By default only metadata is returned and the result is never copied back from
+    the GPU. With return_result=true the sum is returned as raw C-ordered bytes,
+    with the metadata in X-Matrix-Shape, X-Dtype, X-Elapsed-Time and X-Device
+    headers.
+    """
+    dtype = _resolve_precision(precision)
+
+    try:
+        # Load matrices straight from the uploaded .npz files, in worker
+        # threads so that parsing does not block the event loop
+        load_start = time.perf_counter_ns()
+        matrix_a, matrix_b = await asyncio.gather(
+            asyncio.to_thread(load_matrix, file_a),
+            asyncio.to_thread(load_matrix, file_b)
+        )
+        _observe_phase("load", load_start)
 
         # Validate shapes
         if matrix_a.shape != matrix_b.shape:
@@ -99,21 +779,50 @@ async def add_matrices(
                 detail=f"Matrix shapes do not match: {matrix_a.shape} vs {matrix_b.shape}"
             )
 
-        # Convert to float32 if needed (GPU works better with float32)
-        if matrix_a.dtype != np.float32:
-            matrix_a = matrix_a.astype(np.float32)
-        if matrix_b.dtype != np.float32:
-            matrix_b = matrix_b.astype(np.float32)
+        # Inputs that are not of the computation's precision are converted
+        # while being copied into the staging/output buffers of each path,
+        # without an intermediate astype() copy
 
-        # Perform GPU addition
-        result, elapsed_time = gpu_matrix_add(matrix_a, matrix_b)
+        # Perform the addition on GPU only when the matrix is large enough
+        # for the kernel to outweigh the PCIe transfers
+        if matrix_a.size >= GPU_MIN_ELEMENTS:
+            async with _pooled_stream() as stream:
+                payload, elapsed_time = await gpu_matrix_add(
+                    matrix_a, matrix_b, stream, copy_back=return_result, dtype=dtype
+                )
+            device = "GPU"
+        else:
+            result, elapsed_time = await asyncio.to_thread(cpu_matrix_add, matrix_a, matrix_b)
+            PHASE_SECONDS.labels(phase="host").observe(elapsed_time)
+            if return_result:
+                # The float32 sum is only narrowed to the requested precision
+                # for the returned bytes
+                response_start = time.perf_counter_ns()
+                payload = await asyncio.to_thread(lambda: result.astype(dtype, copy=False).tobytes())
+                _observe_phase("response", response_start)
+            else:
+                payload = None
+            device = "CPU"
 
-        # Return response (without the actual result matrix, only metadata)
-        return JSONResponse(content={
-            "matrix_shape": list(result.shape),
-            "elapsed_time": round(elapsed_time, 6),
-            "device": "GPU"
-        })
+        if return_result:
+            response = Response(
+                content=payload,
+                media_type="application/octet-stream",
+                headers={
+                    "X-Matrix-Shape": ",".join(str(n) for n in matrix_a.shape),
+                    "X-Dtype": np.dtype(dtype).name,
+                    "X-Elapsed-Time": str(round(elapsed_time, 6)),
+                    "X-Device": device
+                }
+            )
+        else:
+            # Return response (without the actual result matrix, only metadata)
+            response = JSONResponse(content={
+                "matrix_shape": list(matrix_a.shape),
+                "elapsed_time": round(elapsed_time, 6),
+                "device": device
+            })
+        return response
 
     except HTTPException:
         raise
@@ -121,39 +830,191 @@ async def add_matrices(
         raise HTTPException(status_code=500, detail=f"Error processing matrices: {str(e)}")
 
 
+@app.post("/upload")
+async def upload_matrix(
+    file: UploadFile = File(..., description="Matrix to keep on the GPU (.npz file)"),
+    precision: str = Query("fp32", description="Element type stored on the GPU: fp32 or fp16")
+):
+    """
+    Copy a matrix to the GPU once and keep it there.
+
+    Returns a handle to pass to /add-persistent. The matrix is freed with
+    DELETE /matrix/{handle}, or automatically after RESIDENT_TTL_SECONDS
+    without use. Answers 507 when the matrix would take resident matrices
+    past MAX_RESIDENT_BYTES.
+    """
+    dtype = _resolve_precision(precision)
+
+    try:
+        matrix = await asyncio.to_thread(load_matrix, file)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error uploading matrix: {str(e)}")
+
+    await _purge_expired_matrices()
+    nbytes = matrix.size * np.dtype(dtype).itemsize
+    _reserve_resident_bytes(nbytes)
+
+    try:
+        loop = asyncio.get_running_loop()
+        async with _pooled_stream() as stream:
+            done = loop.create_future()
+            d_matrix, _ = await loop.run_in_executor(
+                _gpu_executor, _submit_upload, matrix, dtype, stream, done
+            )
+            await done
+    except Exception as e:
+        _release_resident_bytes(nbytes)
+        raise HTTPException(status_code=500, detail=f"Error uploading matrix: {str(e)}")
+
+    handle = uuid.uuid4().hex
+    _resident_matrices[handle] = _ResidentMatrix(d_matrix, matrix.shape)
+
+    return {
+        "handle": handle,
+        "matrix_shape": list(matrix.shape),
+        "dtype": np.dtype(dtype).name
+    }
+
+
+class PersistentAddRequest(BaseModel):
+    handle_a: str
+    handle_b: str
+
+
+@app.post("/add-persistent")
+async def add_persistent_matrices(request: PersistentAddRequest):
+    """
+    Add two matrices previously stored with /upload.
+
+    Only the kernel runs: nothing crosses PCIe. The sum stays on the GPU and
+    is returned as a new handle, so it can be fed into further additions and
+    read back with GET /matrix/{handle} once the work is done.
+    Answers 507 when the result would take resident matrices past
+    MAX_RESIDENT_BYTES.
+    """
+    matrix_a = await _get_resident_matrix(request.handle_a)
+    matrix_b = d_c = None
+    try:
+        matrix_b = await _get_resident_matrix(request.handle_b)
+
+        if matrix_a.shape != matrix_b.shape:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Matrix shapes do not match: {matrix_a.shape} vs {matrix_b.shape}"
+            )
+        if matrix_a.array.dtype != matrix_b.array.dtype:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Matrix dtypes do not match: {matrix_a.array.dtype} vs {matrix_b.array.dtype}"
+            )
+
+        _reserve_resident_bytes(matrix_a.nbytes)
+
+        try:
+            loop = asyncio.get_running_loop()
+            async with _pooled_stream() as stream:
+                done = loop.create_future()
+                start_time = time.perf_counter()
+                d_c = await loop.run_in_executor(
+                    _gpu_executor, _submit_resident_add, matrix_a.array, matrix_b.array, stream, done
+                )
+                await done
+                elapsed_time = time.perf_counter() - start_time
+        except Exception as e:
+            _release_resident_bytes(matrix_a.nbytes)
+            raise HTTPException(status_code=500, detail=f"Error processing matrices: {str(e)}")
+
+        handle = uuid.uuid4().hex
+        _resident_matrices[handle] = _ResidentMatrix(d_c, matrix_a.shape)
+
+        return {
+            "handle": handle,
+            "matrix_shape": list(matrix_a.shape),
+            "elapsed_time": round(elapsed_time, 6),
+            "device": "GPU"
+        }
+    finally:
+        # A concurrent DELETE may leave this handler with the last references
+        # to the device arrays, which must be released on the CUDA thread
+        held = [matrix_a, matrix_b, d_c]
+        del matrix_a, matrix_b, d_c
+        await _release_on_gpu_thread(held)
+
+
+@app.get("/matrix/{handle}")
+async def download_matrix(handle: str):
+    """
+    Copy a matrix stored with /upload or produced by /add-persistent back to
+    the host.
+
+    Returns the matrix as raw bytes in C order, with the X-Matrix-Shape and
+    X-Dtype headers of /add?return_result=true. The matrix stays on the GPU.
+    """
+    matrix = await _get_resident_matrix(handle)
+    shape = matrix.shape
+
+    try:
+        loop = asyncio.get_running_loop()
+        async with _pooled_stream() as stream:
+            done = loop.create_future()
+            result = await loop.run_in_executor(
+                _gpu_executor, _submit_download, matrix.array, shape, stream, done
+            )
+            await done
+        payload = await asyncio.to_thread(result.tobytes)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error downloading matrix: {str(e)}")
+    finally:
+        # A concurrent DELETE may leave this handler with the last reference
+        # to the device array, which must be released on the CUDA thread
+        held = [matrix]
+        del matrix
+        await _release_on_gpu_thread(held)
+
+    return Response(
+        content=payload,
+        media_type="application/octet-stream",
+        headers={
+            "X-Matrix-Shape": ",".join(str(n) for n in shape),
+            "X-Dtype": result.dtype.name
+        }
+    )
+
+
+@app.delete("/matrix/{handle}")
+async def delete_matrix(handle: str):
+    """Free a matrix stored with /upload or produced by /add-persistent"""
+    if handle not in _resident_matrices:
+        raise HTTPException(status_code=404, detail=f"Unknown matrix handle: {handle}")
+    await _free_resident_matrices([handle])
+    return {"deleted": handle}
+
+
 @app.get("/gpu-info")
 async def get_gpu_info():
     """
-    Get GPU memory information using nvidia-smi.
+    Get GPU memory information using NVML.
 
-    Returns information about available GPUs including memory usage.
+    Returns information about available GPUs including memory usage, plus the
+    capabilities of the CUDA device used by this service, probed at startup.
     """
-    try:
-        # Run nvidia-smi command
-        result = subprocess.run(
-            ["nvidia-smi", "--query-gpu=index,memory.used,memory.total", "--format=csv,noheader,nounits"],
-            capture_output=True,
-            text=True,
-            check=True
-        )
+    if _nvml_handles is None:
+        raise HTTPException(status_code=500, detail="NVML not available. Is NVIDIA driver installed?")
 
+    try:
         gpus = []
-        for line in result.stdout.strip().split('\n'):
-            if line:
-                parts = [p.strip() for p in line.split(',')]
-                if len(parts) == 3:
-                    gpus.append({
-                        "gpu": parts[0],
-                        "memory_used_MB": int(parts[1]),
-                        "memory_total_MB": int(parts[2])
-                    })
-
-        return {"gpus": gpus}
-
-    except subprocess.CalledProcessError as e:
+        for index, handle in enumerate(_nvml_handles):
+            memory = pynvml.nvmlDeviceGetMemoryInfo(handle)
+            gpus.append({
+                "gpu": str(index),
+                "memory_used_MB": memory.used // 2**20,
+                "memory_total_MB": memory.total // 2**20
+            })
+
+        return {"gpus": gpus, "cuda_device": app.state.cuda_device}
+
+    except pynvml.NVMLError as e:
         raise HTTPException(status_code=500, detail=f"Failed to query GPU: {str(e)}")
-    except FileNotFoundError:
-        raise HTTPException(status_code=500, detail="nvidia-smi not found. Is NVIDIA driver installed?")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting GPU info: {str(e)}")
 
@@ -164,5 +1025,20 @@ if __name__ == "__main__":
     print(f"Available endpoints:")
     print(f"  - GET  /health")
     print(f"  - POST /add")
+    print(f"  - POST /upload")
+    print(f"  - POST /add-persistent")
+    print(f"  - GET  /matrix/{{handle}}")
+    print(f"  - DELETE /matrix/{{handle}}")
     print(f"  - GET  /gpu-info")
-    uvicorn.run(app, host="0.0.0.0", port=STUDENT_PORT)
+    print(f"  - GET  /metrics")
+    # Several workers must be started from the import string; a single worker
+    # serves this module's app directly, so main.py is not imported (and its
+    # kernels compiled) a second time
+    uvicorn.run(
+        app if WORKERS == 1 else "main:app",
+        host="0.0.0.0",
+        port=STUDENT_PORT,
+        workers=WORKERS,
+        loop="uvloop",
+        http="httptools"
+    )
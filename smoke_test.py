@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Smoke test for the host-side helpers of the GPU Matrix Addition Service
+This script exercises the pure-Python code of main.py without requiring GPU
+hardware (Numba runs in its CUDA simulator), so it can be run with the
+Docker image's Python:
+
+    docker run --rm gpu-service python3 smoke_test.py
+"""
+
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+# Kernels are compiled when main is imported; the simulator needs no GPU
+os.environ.setdefault("NUMBA_ENABLE_CUDASIM", "1")
+
+import numpy as np
+from fastapi import HTTPException
+
+import main
+from check_implementation import collect_features
+
+failures = []
+
+def check(condition, message):
+    """Print a check result and remember failures"""
+    print(f"{'✓' if condition else '✗'} {message}")
+    if not condition:
+        failures.append(message)
+
+def spooled_upload(data):
+    """An object shaped like FastAPI's UploadFile, backed by a spooled file as in a request"""
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    spooled.write(data)
+    spooled.seek(0)
+    return SimpleNamespace(file=spooled)
+
+def test_load_matrix():
+    """Load the sample .npz files the way /add and /upload receive them"""
+    print("=" * 60)
+    print("Test 1: load_matrix")
+    print("=" * 60)
+
+    for filename in ['matrix1.npz', 'matrix2.npz']:
+        with open(filename, 'rb') as f:
+            upload = spooled_upload(f.read())
+        with np.load(filename) as data:
+            expected = data[data.files[0]]
+        try:
+            matrix = main.load_matrix(upload)
+        except Exception as e:
+            check(False, f"{filename}: {type(e).__name__}: {e}")
+            continue
+        check(np.array_equal(matrix, expected), f"{filename}: shape={matrix.shape}, dtype={matrix.dtype}")
+
+    # Fortran-ordered arrays come back C-contiguous
+    with tempfile.TemporaryFile() as f:
+        np.savez(f, np.asfortranarray(np.arange(12, dtype=np.float32).reshape(3, 4)))
+        f.seek(0)
+        matrix = main.load_matrix(spooled_upload(f.read()))
+    check(matrix.flags.c_contiguous, "Fortran-ordered input is returned C-contiguous")
+    print()
+
+def test_cpu_matrix_add():
+    """Check the host addition and its precision"""
+    print("=" * 60)
+    print("Test 2: cpu_matrix_add")
+    print("=" * 60)
+
+    a = np.random.rand(100, 100)
+    b = np.random.rand(100, 100)
+    result, elapsed_time = main.cpu_matrix_add(a, b)
+    check(result.dtype == np.float32, f"Result dtype is float32 (got {result.dtype})")
+    check(np.allclose(result, a + b, rtol=1e-6), "Result matches a + b")
+    check(elapsed_time >= 0, f"Elapsed time reported: {elapsed_time:.6f}s")
+
+    result, _ = main.cpu_matrix_add(a.astype(np.float16), b.astype(np.float16))
+    check(result.dtype == np.float32, "float16 inputs are added in float32")
+    print()
+
+def test_resolve_precision():
+    """Check the precision query parameter mapping"""
+    print("=" * 60)
+    print("Test 3: _resolve_precision")
+    print("=" * 60)
+
+    check(main._resolve_precision("fp32") is np.float32, "fp32 -> float32")
+    check(main._resolve_precision("fp16") is np.float16, "fp16 -> float16")
+    try:
+        main._resolve_precision("bf16")
+        check(False, "bf16 is rejected")
+    except HTTPException as e:
+        check(e.status_code == 400, f"bf16 is rejected with {e.status_code}")
+    print()
+
+def test_resident_bytes():
+    """Check the accounting of the resident matrix memory cap"""
+    print("=" * 60)
+    print("Test 4: resident matrix memory cap")
+    print("=" * 60)
+
+    saved = main._resident_bytes
+    try:
+        main._resident_bytes = 0
+        main._reserve_resident_bytes(main.MAX_RESIDENT_BYTES)
+        check(main._resident_bytes == main.MAX_RESIDENT_BYTES, "A reservation up to the cap is accepted")
+        try:
+            main._reserve_resident_bytes(1)
+            check(False, "A reservation past the cap is rejected")
+        except HTTPException as e:
+            check(e.status_code == 507, f"A reservation past the cap is rejected with {e.status_code}")
+        main._release_resident_bytes(main.MAX_RESIDENT_BYTES)
+        check(main._resident_bytes == 0, "Released bytes are returned")
+    finally:
+        main._resident_bytes = saved
+    print()
+
+def test_collect_features():
+    """Check the AST features used by check_implementation.py"""
+    print("=" * 60)
+    print("Test 5: collect_features")
+    print("=" * 60)
+
+    import ast
+    source = (
+        "@app.post('/add')\n"
+        "async def add(a):\n"
+        "    return cuda.to_device(a).copy_to_host()\n"
+    )
+    found = collect_features(ast.parse(source))
+    for feature in ["def:add", "@app.post", "@app.post:/add", "call:cuda.to_device", "attr:copy_to_host", "name:a"]:
+        check(feature in found, f"Found {feature}")
+    print()
+
+if __name__ == "__main__":
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    print()
+    print("GPU MATRIX ADDITION SERVICE - SMOKE TEST")
+    print()
+
+    test_load_matrix()
+    test_cpu_matrix_add()
+    test_resolve_precision()
+    test_resident_bytes()
+    test_collect_features()
+
+    print("=" * 60)
+    if failures:
+        print(f"✗ {len(failures)} check(s) failed")
+    else:
+        print("✓ All smoke checks passed!")
+    print("=" * 60)
+    print()
+    sys.exit(1 if failures else 0)
@@ -104,6 +104,12 @@ def check_dependencies():
     except ImportError:
         print("✗ Prometheus Client: NOT INSTALLED")
     
+    try:
+        import pynvml
+        print(f"✓ NVML (nvidia-ml-py): installed")
+    except ImportError:
+        print("✗ NVML (nvidia-ml-py): NOT INSTALLED")
+    
     print()
 
 def print_usage_instructions():
@@ -113,7 +119,7 @@ def print_usage_instructions():
     print("=" * 60)
     print()
     print("1. Install dependencies (if not already done):")
-    print("   pip install fastapi uvicorn numpy numba-cuda prometheus-client python-multipart")
+    print("   pip install fastapi uvicorn numpy numba-cuda prometheus-client python-multipart nvidia-ml-py")
     print()
     print("2. Start the service:")
     print("   python3 main.py")
@@ -136,6 +142,25 @@ def print_usage_instructions():
     print("     -F 'file_a=@matrix1.npz' \\")
     print("     -F 'file_b=@matrix2.npz'")
     print()
+    print("   # Matrix addition returning the sum as raw float32 bytes")
+    print("   curl -X POST 'http://localhost:8001/add?return_result=true' \\")
+    print("     -F 'file_a=@matrix1.npz' \\")
+    print("     -F 'file_b=@matrix2.npz' -o result.bin")
+    print()
+    print("   # Matrix addition in half precision")
+    print("   curl -X POST 'http://localhost:8001/add?precision=fp16' \\")
+    print("     -F 'file_a=@matrix1.npz' \\")
+    print("     -F 'file_b=@matrix2.npz'")
+    print()
+    print("   # Keep matrices on the GPU and add them by handle")
+    print("   curl -X POST http://localhost:8001/upload -F 'file=@matrix1.npz'")
+    print("   curl -X POST http://localhost:8001/upload -F 'file=@matrix2.npz'")
+    print("   curl -X POST http://localhost:8001/add-persistent \\")
+    print("     -H 'Content-Type: application/json' \\")
+    print("     -d '{\"handle_a\": \"<handle>\", \"handle_b\": \"<handle>\"}'")
+    print("   curl http://localhost:8001/matrix/<handle> -o sum.bin")
+    print("   curl -X DELETE http://localhost:8001/matrix/<handle>")
+    print()
     print("   # Test error handling (mismatched shapes)")
     print("   curl -X POST http://localhost:8001/add \\")
     print("     -F 'file_a=@test_matrix_a.npz' \\")